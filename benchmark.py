@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# coding=utf-8
+"""
+compare the throughput of hand-written rules with the same rules imported from JSON Schema
+
+    python benchmark.py
+    python benchmark.py --records 5000 --repeat 5
+
+the rules only use checks JSON Schema expresses exactly, they are exported
+and imported back keyword by keyword (without "x-rule"), and every variant
+validates the same payloads with auto_trim off and must return the same
+results. if the third party jsonschema package is installed, the exported
+schema is validated with it as well and must pass and fail the same records.
+the payloads include a missing optional field, padded strings and an enum
+value of the wrong type, where a loose conversion would disagree.
+"""
+import argparse
+import random
+import sys
+import time
+
+from helper.schema import JsonSchema
+from helper.validator import Validator
+
+RULES = {
+    'username': 'required|is_str|maxlen:10|is_alpha_dash_num `用户名`',
+    'password': 'required|is_str|minlen:6|maxlen:18 `密码`',
+    'email': 'required|is_str|is_email `邮箱`',
+    'mobile': 'required|is_str|is_mobile `手机号`',
+    'age': 'required|is_integer|gte:18|lte:60 `年龄`',
+    'sex': 'required|is_str|in:0,1,2 `性别`',
+    'bio': 'required|is_str|maxlen:200 `简介`',
+    'nick': '',
+    'grade': {
+        'grade_name': 'required|is_str `年级`',
+        'clsss': 'required|is_integer|gt:0 `班级`',
+    },
+    'education': [
+        {
+            "name": "required|is_str|minlen:5",
+            "address": "required|is_str|minlen:10"
+        }
+    ]
+}
+
+
+def payloads(count, seed):
+    """
+    mostly valid records with some broken fields
+    :param count:
+    :param seed:
+    :return:
+    """
+    rand = random.Random(seed)
+    records = []
+    for i in range(count):
+        record = {
+            "username": "user_%d" % i,
+            "password": "secret%d" % rand.randint(0, 9999),
+            "email": "user%d@example.com" % i,
+            "mobile": "13%09d" % rand.randint(0, 999999999),
+            "age": rand.randint(18, 60),
+            "sex": str(rand.randint(0, 2)),
+            "bio": "hello 💋 <b>world</b> & " * rand.randint(1, 8),
+            "grade": {"grade_name": "grade_%d" % rand.randint(1, 6), "clsss": rand.randint(100, 999)},
+            "education": [
+                {"name": "希望小学123", "address": "朝阳路0001号aaaa"}
+                for _ in range(rand.randint(1, 3))
+            ],
+        }
+        if rand.random() < 0.5:
+            record["nick"] = rand.choice(["nick_%d" % i, i, None])
+        if rand.random() < 0.1:
+            record[rand.choice(["email", "mobile", "age", "sex"])] = "bad value"
+        if rand.random() < 0.05:
+            record["username"] = "  u%d  " % rand.randint(0, 9)
+        if rand.random() < 0.05:
+            record["sex"] = rand.randint(0, 2)
+        records.append(record)
+    return records
+
+
+def without_rule_strings(schema):
+    """
+    drop "x-rule" so load converts the schema keyword by keyword
+    :param schema:
+    :return:
+    """
+    if type(schema) == dict:
+        return {k: without_rule_strings(v) for k, v in schema.items() if k != "x-rule"}
+    return schema
+
+
+def run_per_request(rules, records):
+    """
+    the usual pattern, a new Validator for every request
+    :param rules:
+    :param records:
+    :return:
+    """
+    results = []
+    for record in records:
+        v = Validator(auto_trim=False)
+        ok = v.set_rules(rules).validate(record)
+        results.append((ok, v.get_data() if ok else v.get_error()))
+    return results
+
+
+def run_compiled(rules, records):
+    """
+    one Validator, the rules are compiled once and reused
+    :param rules:
+    :param records:
+    :return:
+    """
+    v = Validator(auto_trim=False).set_rules(rules)
+    results = []
+    for record in records:
+        ok = v.validate(record)
+        results.append((ok, v.get_data() if ok else v.get_error()))
+    return results
+
+
+def run_jsonschema(schema, records):
+    """
+    the third party jsonschema package on the exported schema
+    :param schema:
+    :param records:
+    :return:
+    """
+    import jsonschema
+    validator = jsonschema.Draft202012Validator(schema, format_checker=jsonschema.FormatChecker())
+    return [(validator.is_valid(record), None) for record in records]
+
+
+def best_of(fn, args, repeat):
+    """
+    fastest of repeat runs and the result of the last one
+    :param fn:
+    :param args:
+    :param repeat:
+    :return:
+    """
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="rule strings vs imported JSON Schema throughput")
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    records = payloads(args.records, args.seed)
+    schema = without_rule_strings(JsonSchema.dump(RULES))
+    imported = JsonSchema.load(schema)
+
+    variants = [
+        ("rules, per request", run_per_request, RULES),
+        ("schema, per request", run_per_request, imported),
+        ("rules, compiled once", run_compiled, RULES),
+        ("schema, compiled once", run_compiled, imported),
+    ]
+    try:
+        import jsonschema
+        variants.append(("jsonschema package", run_jsonschema, schema))
+    except ImportError:
+        print("jsonschema package not installed, skipped")
+
+    baseline, expected = None, None
+    print("%-24s %12s %10s" % ("variant", "records/s", "relative"))
+    for name, fn, rules in variants:
+        elapsed, results = best_of(fn, (rules, records), args.repeat)
+        if fn is run_jsonschema:
+            # it only tells whether a record is valid
+            same = [ok for ok, _ in results] == [ok for ok, _ in expected]
+        else:
+            expected = expected or results
+            same = results == expected
+        if not same:
+            print("%s returned different results" % name)
+            return 1
+        throughput = len(records) / elapsed
+        baseline = baseline or throughput
+        print("%-24s %12.0f %9.2fx" % (name, throughput, throughput / baseline))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
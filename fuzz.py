@@ -0,0 +1,300 @@
+#!/usr/bin/python
+# coding=utf-8
+"""
+offline fuzz and performance regression harness for the built-in rules
+
+    python fuzz.py                  # check every built-in rule
+    python fuzz.py is_email is_url  # check some rules only
+    python fuzz.py --raw            # measure the regexes without regex_max_length
+
+every rule is fed random and adversarial (ReDoS style "prefix + pump * n + suffix")
+strings of growing length, the worst-case time per length is fitted on a log-log
+scale and any rule whose slope is above --max-slope (default 1.5, i.e. clearly
+faster than linear) is reported and makes the script exit with status 1.
+the filter chain fusion is also checked against running the filters one by one,
+rules extended on subclasses must stay scoped to them, and records skipped by
+sampled batch validation must return the same data as validate.
+"""
+import argparse
+import math
+import random
+import sys
+import timeit
+
+from helper.validator import FilterChain, RuleRegistry, Validator
+
+PARAMS = {
+    "len": ["10"],
+    "minlen": ["10"],
+    "maxlen": ["10"],
+    "width": ["10"],
+    "minwidth": ["10"],
+    "maxwidth": ["10"],
+    "gt": ["10"],
+    "lt": ["10"],
+    "gte": ["10"],
+    "lte": ["10"],
+    "eq": ["10"],
+    "ne": ["10"],
+    "isin": ["0", "1", "2"],
+    "nin": ["0", "1", "2"],
+    "match": ["allen"],
+}
+
+# (prefix, pump, suffix): the pump is repeated to reach the wanted length and the
+# suffix makes the match fail at the very end, which is what triggers backtracking
+PUMPS = [
+    ("", "a", "!"),
+    ("", "1", "X"),
+    ("", " ", "a"),
+    ("", "你", "a"),
+    ("", "💋", " "),
+    ("", "<&'", '"'),
+    ("1", "9", ""),
+    ("1.", "1", "x"),
+    ("a@", "a", "!"),
+    ("a@", "a.", "!"),
+    ("a@", "-.", "\x00"),
+    ("a@a.", "a-", "@"),
+    ("", "a.", "@"),
+    ("http://", "a", "\x00"),
+    ("http://", "a/", "!\x00"),
+    ("http://", ":;", " "),
+    ("ftp://", "&=", ";"),
+    ("110101", "1", "X"),
+    ("11010119900101", "0", "Y"),
+]
+
+ALPHABET = "aZ09_-.+@:/;&=?#%~|!,<>'\" \t\n你Ⓐß💋\U00010400"
+
+# values a rule can get besides strings, a fused chain must treat them the same
+NON_STR = [False, True, None, 0, 1, 1.5, [], ["a"], {}]
+
+
+def rule_names():
+    """
+    all built-in rules
+    :return:
+    """
+    return list(RuleRegistry.builtin_rules)
+
+
+def adversarial_inputs(length, rand):
+    """
+    pumped strings plus a few random ones of roughly the given length
+    :param length:
+    :param rand:
+    :return:
+    """
+    inputs = []
+    for prefix, pump, suffix in PUMPS:
+        count = max(1, (length - len(prefix) - len(suffix)) // len(pump))
+        inputs.append(prefix + pump * count + suffix)
+    for _ in range(3):
+        inputs.append("".join(rand.choice(ALPHABET) for _ in range(length)))
+    return inputs
+
+
+def time_call(fn, var, params):
+    """
+    best per-call time, the call count is raised until one round takes ~1ms
+    :param fn:
+    :param var:
+    :param params:
+    :return:
+    """
+    number = 1
+    while True:
+        elapsed = min(timeit.repeat(lambda: fn(var, *params), number=number, repeat=3))
+        if elapsed >= 0.001 or number >= 1 << 16:
+            return elapsed / number
+        number *= 4
+
+
+def slope(lengths, times):
+    """
+    least squares slope of log(time) over log(length), ~1 is linear and ~2 is quadratic
+    :param lengths:
+    :param times:
+    :return:
+    """
+    xs = [math.log(n) for n in lengths]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    var = sum((x - mean_x) ** 2 for x in xs)
+    return cov / var
+
+
+def measure(rule, lengths, seed):
+    """
+    worst-case time of a rule for every length
+    :param rule:
+    :param lengths:
+    :param seed:
+    :return:
+    """
+    fn = Validator.registry.get(rule).func
+    params = PARAMS.get(rule, [])
+    rand = random.Random(seed)
+    worst = []
+    for length in lengths:
+        worst_time, worst_input = 0, ""
+        for var in adversarial_inputs(length, rand):
+            elapsed = time_call(fn, var, params)
+            if elapsed > worst_time:
+                worst_time, worst_input = elapsed, var
+        worst.append((worst_time, worst_input))
+    return worst
+
+
+def check_filter_chain(rounds, seed):
+    """
+    property: a fused filter chain returns exactly what the filters return one by one
+    :param rounds:
+    :param seed:
+    :return:
+    """
+    rand = random.Random(seed)
+    names = list(FilterChain.fusible)
+    failures = []
+    for _ in range(rounds):
+        chain = [rand.choice(names) for _ in range(rand.randint(2, 6))]
+        if rand.random() < 0.8:
+            var = "".join(rand.choice(ALPHABET) for _ in range(rand.randint(0, 24)))
+        else:
+            var = rand.choice(NON_STR)
+        if outcome(FilterChain.get(chain), var) != outcome(sequential(chain), var):
+            failures.append((chain, var))
+    return failures
+
+
+def check_registry_scoping():
+    """
+    property: subclasses extending the same rule name each get their own rule
+    and the base Validator sees neither
+    :return:
+    """
+    failures = []
+    tenants = [type("Tenant%s" % name, (Validator,), {}) for name in "AB"]
+    for tenant in tenants:
+        @tenant.extend()
+        def is_tenant(var, name=tenant.__name__):
+            return name
+
+    for tenant in tenants:
+        v = tenant()
+        if not v.set_rules({"a": "is_tenant"}).validate({"a": "x"}) or v.get_data("a") != tenant.__name__:
+            failures.append("%s does not run its own is_tenant" % tenant.__name__)
+    if "is_tenant" in Validator.registry:
+        failures.append("is_tenant leaked into Validator.registry")
+    return failures
+
+
+SAMPLING_RULES = {
+    "mobile": "required|is_mobile",
+    "ip": "required|is_ip",
+    "age": "required|gte:18|lt:120",
+    "name": "required|lower|filer_xss|maxlen:40",
+}
+
+
+def check_sampling(rounds, seed):
+    """
+    property: a record that passes validate gets the same data when sampling skips its checks
+    :param rounds:
+    :param seed:
+    :return:
+    """
+    rand = random.Random(seed)
+    records = []
+    for _ in range(rounds):
+        records.append({
+            "mobile": rand.choice([13800000000, "13800000000", 19912345678]),
+            "ip": rand.choice(["10.0.0.1", "192.168.1.1"]),
+            "age": rand.choice([18, 35.5, "20", "99.5", True]),
+            "name": rand.choice(["Allen", "<B>Bob</B>", "a & b"]),
+        })
+    v = Validator().set_rules(SAMPLING_RULES)
+    results, _ = v.validate_many(records, sample=0)
+    failures = []
+    for record, result in zip(records, results):
+        expected = Validator().set_rules(SAMPLING_RULES)
+        if expected.validate(record) and result != (True, expected.get_data()):
+            failures.append((record, result))
+    return failures
+
+
+def sequential(chain):
+    """
+    the filters run one by one the way Validator runs rules, stopping at the first False
+    :param chain:
+    :return:
+    """
+
+    def run(var):
+        for name in chain:
+            var = getattr(Validator, name)(var)
+            if type(var) == bool and False == var:
+                return False
+        return var
+
+    return run
+
+
+def outcome(fn, var):
+    """
+    the result of fn(var), or the type of the exception it raises
+    :param fn:
+    :param var:
+    :return:
+    """
+    try:
+        return fn(var)
+    except Exception as e:
+        return type(e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="fuzz the built-in rules for super-linear worst cases")
+    parser.add_argument("rules", nargs="*", help="rules to check, default all built-in rules")
+    parser.add_argument("--lengths", default="256,512,1024,2048,4096", help="comma separated input lengths")
+    parser.add_argument("--max-slope", type=float, default=1.5, help="flag rules growing faster than this")
+    parser.add_argument("--raw", action="store_true", help="ignore Validator.regex_max_length")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=2000, help="filter chain property rounds")
+    args = parser.parse_args(argv)
+
+    lengths = [int(n) for n in args.lengths.split(",")]
+    if args.raw:
+        Validator.regex_max_length = {}
+
+    flagged = []
+    print("%-18s %8s %12s  %s" % ("rule", "slope", "worst(us)", "worst input"))
+    for rule in args.rules or rule_names():
+        worst = measure(rule, lengths, args.seed)
+        growth = slope(lengths, [t for t, _ in worst])
+        worst_time, worst_input = worst[-1]
+        mark = ""
+        if growth > args.max_slope:
+            flagged.append(rule)
+            mark = "  <-- super-linear"
+        print("%-18s %8.2f %12.1f  %r%s" % (rule, growth, worst_time * 1e6, worst_input[:24], mark))
+
+    failures = check_filter_chain(args.rounds, args.seed)
+    for chain, var in failures[:10]:
+        print("filter chain mismatch: %s %r" % ("|".join(chain), var))
+    scoping = check_registry_scoping()
+    for failure in scoping:
+        print("registry scoping: %s" % failure)
+    sampling = check_sampling(args.rounds, args.seed)
+    for record, result in sampling[:10]:
+        print("sampled data mismatch: %r %r" % (record, result))
+
+    if flagged:
+        print("super-linear rules: %s" % ", ".join(flagged))
+    return 1 if flagged or failures or scoping or sampling else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+#!/usr/bin/python
+# coding=utf-8
+import decimal
+import math
+
+from helper.validator import RE_IDCARD, RE_MOBILE, Validator
+
+
+class JsonSchema():
+    """
+    convert between validator rules and a JSON Schema subset
+
+    rules = JsonSchema.load(schema)
+    schema = JsonSchema.dump(rules)
+
+    an imported schema is plain validator rules, so it runs through the same
+    compiled path as hand-written rules. dump writes the original rule string
+    to "x-rule" next to the standard keywords, load prefers it so a round trip
+    is lossless; schemas written by hand are converted keyword by keyword.
+
+    load only accepts what the rules reproduce exactly, anything else raises
+    ValueError: "type" must be one of integer, number, string, array, object
+    (checked strictly with is_integer, is_number, is_str, is_list, is_dict),
+    string, numeric and enum keywords need a matching "type" and enum or const
+    values of that type, arrays can only hold objects, and objects only take
+    properties, required and additionalProperties: true. the checks of a rule
+    string also run when the property is missing, so a property with checks
+    must be required. numeric enums coerce the value with int or float first,
+    so 1 and 1.0 compare equal, and the returned data holds the coerced value.
+    the rules are meant for Validator(auto_trim=False), which validator builds,
+    trimming would let padded strings pass maxLength and pattern.
+
+    dump is exact for the strict type rules and the checks following them,
+    except that in and nin compare the text of numbers, so after is_integer
+    or is_number the rules reject 1.0 for "in:1". the coercions int, float and
+    str, filters, width, match and custom rules have no keyword and are only
+    kept in "x-rule"; checks without a strict type rule before them, e.g.
+    "maxlen:10" or "in:0,1,2", are exported for the types they are meant for,
+    so a JSON Schema validator may accept values of other types that the rules
+    reject.
+
+    both directions are pluggable, e.g. for a custom rule:
+
+    JsonSchema.exporters["match_qq"] = lambda params: {"pattern": "^\\d{4,11}$"}
+    JsonSchema.patterns["^\\d{4,11}$"] = "match_qq"
+    """
+
+    dialect = "https://json-schema.org/draft/2020-12/schema"
+
+    # rule name => function(params) returning the keywords of the rule
+    exporters = {
+        "len": lambda params: {"minLength": int(params[0]), "maxLength": int(params[0])},
+        "minlen": lambda params: {"minLength": int(params[0])},
+        "maxlen": lambda params: {"maxLength": int(params[0])},
+        "not_empty": lambda params: {"minLength": 1},
+        "gt": lambda params: {"exclusiveMinimum": JsonSchema.number(params[0])},
+        "gte": lambda params: {"minimum": JsonSchema.number(params[0])},
+        "lt": lambda params: {"exclusiveMaximum": JsonSchema.number(params[0])},
+        "lte": lambda params: {"maximum": JsonSchema.number(params[0])},
+        "eq": lambda params: {"const": JsonSchema.number(params[0])},
+        "ne": lambda params: {"not": {"const": JsonSchema.number(params[0])}},
+        "isin": lambda params: {"enum": JsonSchema.enum(params)},
+        "nin": lambda params: {"not": {"enum": JsonSchema.enum(params)}},
+        "is_email": lambda params: {"format": "email"},
+        "is_url": lambda params: {"format": "uri"},
+        "is_ip": lambda params: {"format": "ipv4"},
+        "is_list": lambda params: {"type": "array"},
+        "is_dict": lambda params: {"type": "object"},
+        "is_integer": lambda params: {"type": "integer"},
+        "is_number": lambda params: {"type": "number"},
+        "is_str": lambda params: {"type": "string"},
+    }
+
+    # pattern => rule name, used in both directions
+    patterns = {
+        RE_MOBILE.pattern: "is_mobile",
+        RE_IDCARD.pattern: "is_idcard",
+        "^[a-zA-Z]+$": "is_alpha",
+        "^[a-zA-Z0-9]+$": "is_alpha_num",
+        "^[a-zA-Z0-9_-]+$": "is_alpha_dash_num",
+        "^[\u4E00-\u9FA5]+$": "is_zh",
+    }
+
+    formats = {
+        "email": "is_email",
+        "uri": "is_url",
+        "ipv4": "is_ip",
+    }
+
+    types = {
+        "integer": "is_integer",
+        "number": "is_number",
+        "string": "is_str",
+        "array": "is_list",
+        "object": "is_dict",
+    }
+
+    # keyword => the types it needs, the rules would check other types too
+    requires = {
+        "minLength": ("string",),
+        "maxLength": ("string",),
+        "pattern": ("string",),
+        "format": ("string",),
+        "minimum": ("integer", "number"),
+        "exclusiveMinimum": ("integer", "number"),
+        "maximum": ("integer", "number"),
+        "exclusiveMaximum": ("integer", "number"),
+        "const": ("string", "integer", "number"),
+        "enum": ("string", "integer", "number"),
+        "not": ("string", "integer", "number"),
+    }
+
+    # keywords carrying no validation
+    annotations = ("$schema", "$id", "$comment", "title", "description", "default", "examples",
+                   "deprecated", "readOnly", "writeOnly", "x-error", "x-rule")
+
+    @staticmethod
+    def number(var):
+        """
+        rule params are strings, JSON Schema wants numbers
+        :param var:
+        :return:
+        """
+        try:
+            return int(var)
+        except ValueError:
+            return float(var)
+
+    @staticmethod
+    def enum(params):
+        """
+        isin compares str(var), so "1" and 1 both pass
+        :param params:
+        :return:
+        """
+        values = list(params)
+        for param in params:
+            try:
+                values.append(int(param))
+            except ValueError:
+                pass
+        return values
+
+    @staticmethod
+    def dump(rules):
+        """
+        convert validator rules to a JSON Schema
+        :param rules:
+        :return:
+        """
+        assert type(rules) == dict, "the rules must be type of dict"
+        schema = __class__.__dump_object(rules)
+        schema["$schema"] = __class__.dialect
+        return schema
+
+    @staticmethod
+    def load(schema):
+        """
+        convert a JSON Schema to validator rules
+        :param schema:
+        :return:
+        """
+        assert type(schema) == dict, "the schema must be type of dict"
+        if schema.get("type", "object") != "object" or "properties" not in schema:
+            raise ValueError("the root schema must be an object with properties")
+        return __class__.__load_object(schema)
+
+    @staticmethod
+    def validator(schema, **kwargs):
+        """
+        a Validator with the rules of the schema already set, auto_trim is off
+        :param schema:
+        :param kwargs:
+        :return:
+        """
+        if kwargs.setdefault("auto_trim", False):
+            raise ValueError("auto_trim changes the strings the schema checks")
+        return Validator(**kwargs).set_rules(__class__.load(schema))
+
+    @staticmethod
+    def __dump_object(rules):
+        properties, required = {}, []
+        for field, rule in rules.items():
+            if not field: continue
+            if type(rule) == list:
+                # a missing array or object fails the rules as well
+                properties[field] = {"type": "array", "items": __class__.__dump_object(rule[0])}
+                required.append(field)
+            elif type(rule) == dict:
+                properties[field] = __class__.__dump_object(rule)
+                required.append(field)
+            elif type(rule) == str:
+                properties[field], is_required = __class__.__dump_rule(rule)
+                if is_required:
+                    required.append(field)
+            else:
+                raise ValueError("rule type %s is not support" % type(rule))
+        schema = {"type": "object", "properties": properties}
+        if required:
+            schema["required"] = required
+        return schema
+
+    @staticmethod
+    def __dump_rule(rule):
+        _rule, _label, _tip = Validator.parse_rule(rule)
+        _rule = [item.strip() for item in _rule if item.strip()]
+        schema, is_required = {}, False
+        for item in _rule:
+            func, params = item, []
+            if ":" in item:
+                func, raw_params = item.split(":")[:2]
+                params = raw_params.split(",")
+            func = {"in": "isin"}.get(func, func)
+            if func == "required":
+                is_required = True
+            elif func in __class__.exporters:
+                schema.update(__class__.exporters[func](params))
+            else:
+                pattern = next((k for k, v in __class__.patterns.items() if v == func), None)
+                if pattern is not None:
+                    schema["pattern"] = pattern
+        types = {"string": (str,), "integer": (int,), "number": (int, float)}.get(schema.get("type"))
+        if types is not None:
+            # the enum holds the values of every type the rule may be meant for
+            for owner in (schema, schema.get("not", {})):
+                if "enum" in owner:
+                    owner["enum"] = [value for value in owner["enum"] if type(value) in types]
+        if _label:
+            schema["title"] = _label
+        if _tip:
+            schema["x-error"] = _tip
+        schema["x-rule"] = "|".join(_rule)
+        return schema, is_required
+
+    @staticmethod
+    def __load_object(schema):
+        for keyword, value in schema.items():
+            if keyword in ("type", "properties", "required") or keyword in __class__.annotations:
+                continue
+            if keyword == "additionalProperties" and value is True:
+                continue
+            raise ValueError("object keyword %s: %r is not support" % (keyword, value))
+        rules = {}
+        required = schema.get("required", [])
+        for field, prop in schema.get("properties", {}).items():
+            if prop.get("type") in ("object", "array") and "x-rule" not in prop and field not in required:
+                raise ValueError("property %s must be required, the rules check it when it is missing" % field)
+            if prop.get("type") == "object" and "properties" in prop and "x-rule" not in prop:
+                rules[field] = __class__.__load_object(prop)
+            elif prop.get("type") == "array" and "properties" in prop.get("items", {}) and "x-rule" not in prop:
+                for keyword, value in prop.items():
+                    if keyword not in ("type", "items") and keyword not in __class__.annotations:
+                        raise ValueError("array keyword %s: %r is not support" % (keyword, value))
+                rules[field] = [__class__.__load_object(prop["items"])]
+            else:
+                rules[field] = __class__.__load_rule(prop, field in required)
+        return rules
+
+    @staticmethod
+    def __load_rule(prop, is_required):
+        if "x-rule" in prop:
+            _rule = [prop["x-rule"]] if prop["x-rule"] else []
+        else:
+            _rule = ["required"] if is_required else []
+            kind = prop.get("type")
+            if kind is not None:
+                if type(kind) != str or kind not in __class__.types:
+                    raise ValueError("type %r is not support" % (kind,))
+                # the type is checked first, the other checks then only see that type
+                _rule.append(__class__.types[kind])
+            for keyword, value in prop.items():
+                if keyword == "type" or keyword in __class__.annotations:
+                    continue
+                if keyword in __class__.requires and kind not in __class__.requires[keyword]:
+                    raise ValueError("keyword %s needs type %s" % (keyword, " or ".join(__class__.requires[keyword])))
+                _rule.extend(__class__.__load_keyword(keyword, value, prop))
+            if _rule and not is_required:
+                raise ValueError("property with %s must be required, the rules check it when it is missing"
+                                 % "|".join(_rule))
+        rule = "|".join(_rule)
+        if prop.get("x-error"):
+            rule += " ``%s``" % prop["x-error"]
+        elif prop.get("title"):
+            rule += " `%s`" % prop["title"]
+        return rule
+
+    @staticmethod
+    def __load_keyword(keyword, value, prop):
+        if keyword == "minLength":
+            if prop.get("maxLength") == value:
+                return ["len:%s" % value]
+            return ["minlen:%s" % value]
+        if keyword == "maxLength":
+            return [] if prop.get("minLength") == value else ["maxlen:%s" % value]
+        kind = prop.get("type")
+        checks = {"exclusiveMinimum": "gt", "minimum": "gte", "exclusiveMaximum": "lt", "maximum": "lte"}
+        if keyword in checks and type(value) in (int, float):
+            return ["%s:%s" % (checks[keyword], __class__.__param(value))]
+        if keyword == "const" and type(value) in (int, float) and kind != "string":
+            return ["eq:%s" % __class__.__param(value)]
+        if keyword == "const" and type(value) == str and kind == "string":
+            return ["in:%s" % __class__.__join([value])]
+        if keyword == "enum":
+            return __class__.__enum("in", value, kind)
+        if keyword == "not" and type(value) == dict and len(value) == 1:
+            if type(value.get("const")) in (int, float) and kind != "string":
+                return ["ne:%s" % __class__.__param(value["const"])]
+            if "enum" in value:
+                return __class__.__enum("nin", value["enum"], kind)
+        if keyword == "format" and value in __class__.formats:
+            return [__class__.formats[value]]
+        if keyword == "pattern" and value in __class__.patterns:
+            return [__class__.patterns[value]]
+        if keyword == "items" and value == {}:
+            return []
+        raise ValueError("keyword %s: %r is not support" % (keyword, value))
+
+    @staticmethod
+    def __param(value):
+        # the rules parse params with int() or float(), which do not read 1e+20 back as a number
+        if type(value) == float and not math.isfinite(value):
+            raise ValueError("number %r cannot be written as a rule param" % value)
+        text = repr(value)
+        if "e" in text:
+            text = format(decimal.Decimal(text), "f")
+        return text
+
+    @staticmethod
+    def __enum(func, values, kind):
+        # isin compares str(var), numbers are coerced first so 1 and 1.0 give the same text
+        if type(values) != list or not values:
+            raise ValueError("enum %r is not support" % (values,))
+        params = []
+        for value in values:
+            if kind == "string" and type(value) == str:
+                params.append(value)
+            elif kind == "integer" and (type(value) == int or type(value) == float and value.is_integer()):
+                params.append(str(int(value)))
+            elif kind == "number" and type(value) in (int, float):
+                try:
+                    number = float(value)
+                except OverflowError:
+                    number = math.inf
+                if not math.isfinite(number):
+                    raise ValueError("number %r cannot be written as a rule param" % value)
+                params.append(str(number))
+            else:
+                raise ValueError("enum value %r does not match type %s" % (value, kind))
+        coercion = {"integer": ["int"], "number": ["float"]}.get(kind, [])
+        return coercion + ["%s:%s" % (func, __class__.__join(params))]
+
+    @staticmethod
+    def __join(values):
+        values = [str(value) for value in values]
+        values = [value for i, value in enumerate(values) if value not in values[:i]]
+        for value in values:
+            if "," in value or "|" in value or "`" in value or ":" in value:
+                raise ValueError("enum value %r cannot be written as a rule param" % value)
+        return ",".join(values)
@@ -1,33 +1,86 @@
 #!/usr/bin/python
 # coding=utf-8
+import math
 import operator
+import random
 import re
 import sys
-from functools import wraps
-from inspect import getattr_static
+from functools import partial
+from inspect import iscoroutinefunction
+from statistics import NormalDist
 import copy
 
+EMOJI_RANGES = (
+    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F700-\U0001F77F"  # alchemical symbols
+    "\U0001F780-\U0001F7FF"  # Geometric Shapes Extended
+    "\U0001F800-\U0001F8FF"  # Supplemental Arrows-C
+    "\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
+    "\U0001FA00-\U0001FA6F"  # Chess Symbols
+    "\U0001FA70-\U0001FAFF"  # Symbols and Pictographs Extended-A
+    "\U00002702-\U000027B0"  # Dingbats
+    "\U000024C2-\U0001F251"
+)
+MB4_RANGES = "\U00010000-\U0010FFFF"
+
+RE_EMOJI = re.compile("[" + EMOJI_RANGES + "]+", flags=re.UNICODE)
+RE_MB4 = re.compile("[" + MB4_RANGES + "]+")
+
+RE_MOBILE = re.compile("^1[3-9][0-9]{9}$")
+RE_EMAIL = re.compile("(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)")
+RE_IDCARD = re.compile(
+    "(^[1-9]\d{5}(18|19|([23]\d))\d{2}((0[1-9])|(10|11|12))(([0-2][1-9])|10|20|30|31)\d{3}[0-9Xx]$)|(^[1-9]\d{5}\d{2}((0[1-9])|(10|11|12))(([0-2][1-9])|10|20|30|31)\d{3}$)")
+RE_IP = re.compile("^((\d|[1-9]\d|1\d\d|2([0-4]\d|5[0-5]))\.){4}$")
+RE_URL = re.compile("^(https?|ftp|file)://[-A-Za-z0-9+&@#/%?=~_|!:,.;]+[-A-Za-z0-9+&@#/%=~_|]$")
+RE_ALPHA = re.compile("^([a-z])+$", re.IGNORECASE)
+RE_ALPHA_NUM = re.compile("^([a-z0-9])+$", re.IGNORECASE)
+RE_ALPHA_DASH_NUM = re.compile("^([a-z0-9_-])+$", re.IGNORECASE)
+RE_ZH = re.compile("^([\u4E00-\u9FA5])+$")
+
 
 class Validator():
     """
     python form data validation class
     """
 
-    def __init__(self, auto_trim=True, lang="zh"):
+    # inputs longer than this are rejected before the regex runs, so a hostile
+    # string can never reach a backtracking pattern; None or missing means no limit.
+    # is_idcard and is_ip cannot match anything longer anyway, but the email and url
+    # patterns are unbounded, so longer addresses (RFC 5321 allows 254 characters)
+    # and urls that used to pass are now rejected
+    regex_max_length = {
+        "is_email": 254,
+        "is_url": 8192,
+        "is_idcard": 19,
+        "is_ip": 15,
+    }
+
+    def __init__(self, auto_trim=True, lang="zh", registry=None):
         self.auto_trim = auto_trim
         self.lang = lang
+        registry = registry if registry is not None else type(self).registry
+        if type(self) is not __class__:
+            registry = self.__subclass_registry(registry)
+        self.registry = registry
         self.rules = []
+        self.compiled = {}
+        self.compiled_structural = None
         self.errors = []
         self.data_verified = {}
 
     def set_rules(self, rules):
         """
-        set validate rules
+        set validate rules, every rule name is resolved against the registry once here
         :param rules:
         :return:
         """
         assert type(rules) == dict, "the rules must be type of dict"
         self.rules = rules
+        self.compiled = self.__compile(rules)
+        self.compiled_structural = None
         return self
 
     def validate(self, data_raw):
@@ -36,17 +89,87 @@ class Validator():
         :param data_raw:
         :return:
         """
-        assert type(data_raw) == dict, "the raw data must be type of dict"
-        self.data_raw = data_raw
-        self.data_copy = copy.deepcopy(data_raw)
-
-        ret = self.__execute(self.data_copy, self.rules)
-        if False == ret:
-            return False
-        if len(self.errors) > 0:
-            return False
-        self.data_verified = ret
-        return True
+        return self.__validate(data_raw, self.compiled)
+
+    def iter_validate(self, records, sample=None, reservoir=None, seed=None, report=None):
+        """
+        validate records one by one and yield (ok, data or error string) for each,
+        the same as validate, get_data and get_error would return.
+        every rule runs on a share of the records, chosen at random with the
+        probability sample, or on a reservoir sample of the given size; the other
+        records skip the checks of higher cost and only get the structural rules
+        (cost 0 in the registry: required, not_empty, is_list, is_dict, strict
+        types), the transforming rules (trim, coercions and filters) and the
+        normalize function of the skipped checks (str for the regex checks, a
+        number for the comparisons), so the data of a record passing every check
+        does not depend on the draw. the failing fields of the sampled records
+        are counted in report, a report passed again keeps counting
+        :param records:
+        :param sample:
+        :param reservoir:
+        :param seed:
+        :param report:
+        :return:
+        """
+        if sample is not None and reservoir is not None:
+            raise ValueError("sample and reservoir cannot be used together")
+        if sample is not None and not 0 <= sample <= 1:
+            raise ValueError("sample must be between 0 and 1")
+        if reservoir is not None and reservoir < 0:
+            raise ValueError("reservoir must not be negative")
+        if self.compiled_structural is None:
+            self.compiled_structural = self.__compile(self.rules, structural=True)
+        report = report if report is not None else SampleReport()
+        # a reused report keeps counting, it covers the fields of every batch
+        report.fields += [field for field in self.__field_paths(self.compiled) if field not in report.fields]
+        return self.__iter_validate(records, 1.0 if sample is None else sample, reservoir, seed, report)
+
+    def __iter_validate(self, records, sample, reservoir, seed, report):
+        rand = random.Random(seed)
+        slots = []
+        for i, record in enumerate(records):
+            report.records += 1
+            if reservoir is None:
+                slot = 0 if rand.random() < sample else None
+            elif i < reservoir:
+                slot = i
+            else:
+                slot = rand.randint(0, i)
+                slot = slot if slot < reservoir else None
+            if slot is None:
+                ok = self.__validate(record, self.compiled_structural)
+            else:
+                ok = self.__validate(record, self.compiled)
+                failed = set()
+                if not ok:
+                    # a second pass over every field, only for the report
+                    errors, self.errors = self.errors, []
+                    self.__execute(record, self.compiled, failed)
+                    self.errors = errors
+                if reservoir is not None:
+                    # algorithm R: the record takes the slot and the one it evicts leaves the estimate
+                    if slot < len(slots):
+                        report.discard(slots[slot])
+                        slots[slot] = failed
+                    else:
+                        slots.append(failed)
+                report.add(failed)
+            yield ok, self.data_verified if ok else self.get_error()
+
+    def validate_many(self, records, sample=None, reservoir=None, seed=None, confidence=0.95):
+        """
+        validate a batch of records, see iter_validate
+        returns the list of (ok, data or error string) and the SampleReport
+        :param records:
+        :param sample:
+        :param reservoir:
+        :param seed:
+        :param confidence:
+        :return:
+        """
+        report = SampleReport(confidence)
+        results = list(self.iter_validate(records, sample, reservoir, seed, report))
+        return results, report
 
     def get_data(self, key=None):
         """
@@ -63,32 +186,105 @@ class Validator():
         """
         return "\n".join(self.errors)
 
-    def __execute(self, data_raw, rules):
-        data = {}
+    def __validate(self, data_raw, compiled):
+        assert type(data_raw) == dict, "the raw data must be type of dict"
+        self.errors = []
+        self.data_verified = {}
+        self.data_raw = data_raw
+
+        ret = self.__execute(data_raw, compiled)
+        if False == ret:
+            return False
+        if len(self.errors) > 0:
+            return False
+        self.data_verified = ret
+        return True
+
+    def __subclass_registry(self, parent):
+        # methods of a subclass are rules too, new ones as well as overrides of built-in ones
+        registry = RuleRegistry(parent)
+        for klass in type(self).__mro__:
+            if klass is __class__ or not issubclass(klass, __class__):
+                continue
+            for name in vars(klass):
+                if name.startswith("_") or name in registry.rules:
+                    continue
+                if hasattr(__class__, name) and name not in RuleRegistry.builtin_rules:
+                    continue
+                func = getattr(self, name)
+                if not callable(func):
+                    continue
+                entry = parent.get(name)
+                if entry is None:
+                    registry.register(name, func)
+                else:
+                    registry.register(name, func, cost=entry.cost, transform=entry.transform,
+                                      normalize=entry.normalize)
+        return registry
+
+    def __compile(self, rules, structural=False):
+        compiled = {}
         for field, rule in rules.items():
             if not field: continue
             if type(rule) == list:
+                compiled[field] = (list, self.__compile(rule[0], structural))
+            elif type(rule) == dict:
+                compiled[field] = (dict, self.__compile(rule, structural))
+            elif type(rule) == str:
+                _rule, _label, _tip = self.parse_rule(rule)
+                if self.auto_trim:
+                    _rule.insert(0, "trim")
+                compiled[field] = (str, self.__resolve_rules(_rule, structural), _label, _tip)
+            else:
+                raise ValueError("rule type %s is not support" % type(rule))
+        return compiled
+
+    def __execute(self, data_raw, compiled, failed=None, path=""):
+        # with a failed set every field is checked and the failing paths are collected
+        data = {}
+        for field, node in compiled.items():
+            if node[0] == list:
                 if type(data_raw.get(field)) != list:
                     raise ValueError("%s must be list" % field)
                 data[field] = []
                 for item in data_raw[field]:
-                    ret = self.__execute(item, rule[0])
+                    ret = self.__execute(item, node[1], failed, path + field + "[].")
                     if type(ret) == bool and False == ret:
                         return False
                     data[field].append(ret)
-            elif type(rule) == dict:
-                data[field] = self.__execute(data_raw.get(field, None), rule)
-            elif type(rule) == str:
-                _rule, _label, _tip = self.__parse_rules(rule)
-                ret = self.__execute_rule(field, data_raw.get(field, None), _rule, _label, _tip)
+            elif node[0] == dict:
+                data[field] = self.__execute(data_raw.get(field, None), node[1], failed, path + field + ".")
+            else:
+                value = data_raw.get(field, None)
+                if type(value) not in (str, int, float, bool, type(None)):
+                    # only mutable values need a copy, the containers above are rebuilt anyway
+                    value = copy.deepcopy(value)
+                ret = self.__execute_rule(field, value, node[1], node[2], node[3])
                 if type(ret) == bool and False == ret:
-                    return False
+                    if failed is None:
+                        return False
+                    failed.add(path + field)
                 data[field] = ret
-            else:
-                raise ValueError("rule type %s is not support" % type(rule))
         return data
 
-    def __parse_rules(self, rule):
+    def __field_paths(self, compiled, path=""):
+        paths = []
+        for field, node in compiled.items():
+            if node[0] == list:
+                paths.extend(self.__field_paths(node[1], path + field + "[]."))
+            elif node[0] == dict:
+                paths.extend(self.__field_paths(node[1], path + field + "."))
+            else:
+                paths.append(path + field)
+        return paths
+
+    @staticmethod
+    def parse_rule(rule):
+        """
+        split a rule string into its rule list, label and tip
+        :param rule:
+        :return:
+        """
         _rule, _label, _tip = ([], "", "")
         pos = rule.find("`")
         if pos == -1:
@@ -103,9 +299,30 @@ class Validator():
                 pass
         return _rule, _label, _tip
 
-    def __execute_rule(self, field, data, rules=[], label="", tip=""):
-        if self.auto_trim:
-            rules.insert(0, "trim")
+    def __execute_rule(self, field, data, steps=[], label="", tip=""):
+        for func, fn, params, raw_params in steps:
+            if func == "match":
+                params = [self.data_raw.get(params)]
+            data = fn(data, *params)
+            if type(data) == bool and False == data:
+                if not tip:
+                    label = label if label else field
+                    error_tpl = ErrorTemplates.get(self.lang, func)
+                    format_param_count = error_tpl.count("%s")
+                    if format_param_count == 2:
+                        error_msg = error_tpl % (label, raw_params)
+                    elif format_param_count == 1:
+                        error_msg = error_tpl % label
+                    else:
+                        error_msg = error_tpl
+                else:
+                    error_msg = tip
+                self.__set_error(error_msg)
+                return False
+        return data
+
+    def __resolve_rules(self, rules, structural=False):
+        steps, chain = [], []
         for rule in rules:
             rule = str(rule).strip()
             if not rule:
@@ -116,31 +333,36 @@ class Validator():
                 raw_params = expand[1]
                 func, params = expand[0], expand[1].split(",")
                 if func == "match":
-                    params, raw_params = self.__get_refrence_data(raw_params)
+                    # the referenced value is only known at validate time
+                    params, raw_params = raw_params, self.__get_refrence_label(raw_params)
             else:
                 func, params = rule, []
             func = self.__parse_func_alias(func)
-            if hasattr(self, func):
-                fn = getattr(self, func)
-                data = fn(data, *params)
-                if type(data) == bool and False == data:
-                    if not tip:
-                        label = label if label else field
-                        error_tpl = ErrorTemplates.get(self.lang, func)
-                        format_param_count = error_tpl.count("%s")
-                        if format_param_count == 2:
-                            error_msg = error_tpl % (label, raw_params)
-                        elif format_param_count == 1:
-                            error_msg = error_tpl % label
-                        else:
-                            error_msg = error_tpl
-                    else:
-                        error_msg = tip
-                    self.__set_error(error_msg)
-                    return False
-            else:
+            entry = self.registry.get(func)
+            if entry is None:
                 raise AttributeError("%s.%s cannot be call" % (__class__, func))
-        return data
+            if entry.is_async:
+                raise ValueError("rule %s is async and cannot be run by %s" % (func, __class__.__name__))
+            if structural and entry.cost > 0 and not entry.transform:
+                if entry.normalize is None:
+                    continue
+                # the check is skipped but the value it returns when it passes is kept
+                entry, params = Rule(func, entry.normalize), []
+            if not params and FilterChain.is_fusible(entry):
+                chain.append(entry)
+                continue
+            steps.extend(self.__fuse_filters(chain))
+            chain = []
+            steps.append((func, entry.func, params, raw_params))
+        steps.extend(self.__fuse_filters(chain))
+        return steps
+
+    def __fuse_filters(self, chain):
+        if not chain:
+            return []
+        if len(chain) == 1:
+            return [(chain[0].name, chain[0].func, [], "")]
+        return [("filter_chain", FilterChain.get([entry.name for entry in chain]), [], "")]
 
     def __parse_func_alias(self, func):
         alias = {
@@ -148,31 +370,16 @@ class Validator():
         }
         return alias.get(func, func)
 
-    def __get_refrence_data(self, key):
-        params = self.data_raw.get(key)
+    def __get_refrence_label(self, key):
         label = key
         rule = self.rules.get(key)
         if type(rule) == str:
-            _, label, _ = self.__parse_rules(rule)
-        return [params], label if label else key
+            _, label, _ = self.parse_rule(rule)
+        return label if label else key
 
     def __set_error(self, error_msg):
         self.errors.append(error_msg)
 
-    def __del__(self):
-        try:
-            self.data_raw.clear()
-        except:
-            pass
-        try:
-            self.data_copy.clear()
-        except:
-            pass
-        try:
-            self.data_verified.clear()
-        except:
-            pass
-
     ####################################################################
     #                           verify method                          #
     ####################################################################
@@ -418,7 +625,7 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match("^1[3-9][0-9]{9}$", str(var)) else False
+        return __class__.__regex_match("is_mobile", RE_MOBILE, var)
 
     @staticmethod
     def is_email(var):
@@ -427,7 +634,7 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match("(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)", str(var)) else False
+        return __class__.__regex_match("is_email", RE_EMAIL, var)
 
     @staticmethod
     def is_idcard(var):
@@ -436,9 +643,7 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match(
-            "(^[1-9]\d{5}(18|19|([23]\d))\d{2}((0[1-9])|(10|11|12))(([0-2][1-9])|10|20|30|31)\d{3}[0-9Xx]$)|(^[1-9]\d{5}\d{2}((0[1-9])|(10|11|12))(([0-2][1-9])|10|20|30|31)\d{3}$)",
-            str(var)) else False
+        return __class__.__regex_match("is_idcard", RE_IDCARD, var)
 
     @staticmethod
     def is_ip(var):
@@ -447,7 +652,9 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match("^((\d|[1-9]\d|1\d\d|2([0-4]\d|5[0-5]))\.){4}$", str(var) + ".") else False
+        if not __class__.__within_max_length("is_ip", str(var)):
+            return False
+        return str(var) if RE_IP.match(str(var) + ".") else False
 
     @staticmethod
     def is_url(var):
@@ -456,7 +663,7 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match("^(https?|ftp|file)://[-A-Za-z0-9+&@#/%?=~_|!:,.;]+[-A-Za-z0-9+&@#/%=~_|]$", str(var)) else False
+        return __class__.__regex_match("is_url", RE_URL, var)
 
     @staticmethod
     def is_list(var):
@@ -476,6 +683,35 @@ class Validator():
         """
         return var if type(var) == dict else False
 
+    @staticmethod
+    def is_integer(var):
+        """
+        The specified field value must be integer, strings are not converted
+        :param var:
+        :return:
+        """
+        if type(var) == float and var.is_integer():
+            return var
+        return var if type(var) == int else False
+
+    @staticmethod
+    def is_number(var):
+        """
+        The specified field value must be int or float, strings are not converted
+        :param var:
+        :return:
+        """
+        return var if type(var) in (int, float) else False
+
+    @staticmethod
+    def is_str(var):
+        """
+        The specified field value must be str
+        :param var:
+        :return:
+        """
+        return var if type(var) == str else False
+
     @staticmethod
     def is_alpha(var):
         """
@@ -483,7 +719,7 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match("^([a-z])+$", str(var), re.IGNORECASE) else False
+        return __class__.__regex_match("is_alpha", RE_ALPHA, var)
 
     @staticmethod
     def is_alpha_num(var):
@@ -492,7 +728,7 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match("^([a-z0-9])+$", str(var), re.IGNORECASE) else False
+        return __class__.__regex_match("is_alpha_num", RE_ALPHA_NUM, var)
 
     @staticmethod
     def is_alpha_dash_num(var):
@@ -501,7 +737,7 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match("^([a-z0-9_-])+$", str(var), re.IGNORECASE) else False
+        return __class__.__regex_match("is_alpha_dash_num", RE_ALPHA_DASH_NUM, var)
 
     @staticmethod
     def is_zh(var):
@@ -510,7 +746,20 @@ class Validator():
         :param var:
         :return:
         """
-        return str(var) if re.match("^([\u4E00-\u9FA5])+$", str(var)) else False
+        return __class__.__regex_match("is_zh", RE_ZH, var)
+
+    @staticmethod
+    def __regex_match(rule, regex, var):
+        var = str(var)
+        if not __class__.__within_max_length(rule, var):
+            return False
+        # fullmatch, a "$" alone would also accept a trailing newline
+        return var if regex.fullmatch(var) else False
+
+    @staticmethod
+    def __within_max_length(rule, var):
+        max_length = __class__.regex_max_length.get(rule)
+        return max_length is None or len(var) <= max_length
 
     ####################################################################
     #                          filter method                           #
@@ -586,6 +835,8 @@ class Validator():
         :param var:
         :return:
         """
+        if type(var) == str:
+            return RE_MB4.sub("", var)
         return ''.join(c for c in var if ord(c) <= 0xffff)
 
     @staticmethod
@@ -595,22 +846,6 @@ class Validator():
         :param var:
         :return:
         """
-        RE_EMOJI = re.compile(
-            "["
-            "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-            "\U0001F300-\U0001F5FF"  # symbols & pictographs
-            "\U0001F600-\U0001F64F"  # emoticons
-            "\U0001F680-\U0001F6FF"  # transport & map symbols
-            "\U0001F700-\U0001F77F"  # alchemical symbols
-            "\U0001F780-\U0001F7FF"  # Geometric Shapes Extended
-            "\U0001F800-\U0001F8FF"  # Supplemental Arrows-C
-            "\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
-            "\U0001FA00-\U0001FA6F"  # Chess Symbols
-            "\U0001FA70-\U0001FAFF"  # Symbols and Pictographs Extended-A
-            "\U00002702-\U000027B0"  # Dingbats
-            "\U000024C2-\U0001F251"
-            "]+", flags=re.UNICODE
-        )
         return RE_EMOJI.sub("", str(var))
 
     @staticmethod
@@ -632,31 +867,341 @@ class Validator():
     ####################################################################
 
     @classmethod
-    def extend(cls):
-        """
-        extend validator method
+    def extend(cls, pure=False, cost=1, is_async=None, transform=False, normalize=None):
+        """
+        extend validator method, Validator.extend registers the rule in the default
+        registry shared by every Validator, a subclass gets a registry of its own
+        falling back to the one of its parent, so the rule is only seen by that
+        subclass and its children. pass transform=True for a rule that only
+        converts the value and never fails, and normalize for a check that
+        returns a converted value, see Rule
         for example:
 
-        @Validator.extend(Validator)
+        @Validator.extend()
         def is_username(var):
             return str(var) if re.match("^([a-z0-9_-])+$", str(var), re.IGNORECASE) else False
 
         """
+        if "registry" not in vars(cls):
+            cls.registry = RuleRegistry(cls.registry)
+        return cls.registry.extend(pure=pure, cost=cost, is_async=is_async, transform=transform,
+                                   normalize=normalize)
 
-        def decorator(func):
-            @wraps(func)
-            def wrapper(self, *args, **kwargs):
-                return func(self, *args, **kwargs)
 
-            if getattr_static(cls, func.__name__, None):
-                msg = 'Error method name REPEAT, {} has exist'.format(func.__name__)
-                raise NameError(msg)
+class FilterChain():
+    """
+    fuse a run of consecutive string filters into as few passes as possible,
+    e.g. trim|lower|filter_mb4|filer_emoji|filer_xss runs strip, lower,
+    a single deletion regex and the xss escape instead of five separate rules
+    """
+
+    fusible = ("trim", "lower", "upper", "filter_mb4", "filer_emoji", "filer_xss")
+
+    deletions = {
+        "filter_mb4": MB4_RANGES,
+        "filer_emoji": EMOJI_RANGES,
+    }
+
+    cache = {}
+
+    @staticmethod
+    def is_fusible(entry):
+        """
+        only the built-in filters are fused, a registry or subclass overriding one of them keeps its own
+        :param entry:
+        :return:
+        """
+        return entry.name in __class__.fusible and entry.func is getattr(Validator, entry.name)
+
+    @staticmethod
+    def get(names):
+        """
+        get the fused filter for a run of filter names
+        :param names:
+        :return:
+        """
+        names = tuple(names)
+        chain = __class__.cache.get(names)
+        if chain is None:
+            chain = __class__.cache[names] = __class__.__compile(names)
+        return chain
+
+    @staticmethod
+    def __compile(names):
+        stages, deletes, escapes = [], [], 0
+
+        def flush():
+            # deleting characters and escaping xss commute, so a run of them
+            # collapses into one regex pass followed by the escapes
+            if deletes:
+                stages.append(partial(re.compile(__class__.__char_class(deletes)).sub, ""))
+            stages.extend([Validator.filer_xss] * escapes)
+            del deletes[:]
+
+        for name in names:
+            if name in __class__.deletions:
+                if __class__.deletions[name] not in deletes:
+                    deletes.append(__class__.deletions[name])
+            elif name == "filer_xss":
+                escapes += 1
+            else:
+                flush()
+                escapes = 0
+                stage = {"trim": str.strip, "lower": str.lower, "upper": str.upper}[name]
+                if stage is str.strip and stages and stages[-1] is str.strip:
+                    continue
+                stages.append(stage)
+        flush()
+
+        fallback = [getattr(Validator, name) for name in names]
+
+        def chain(var):
+            if type(var) != str:
+                # same as running the rules one by one, which stop at the first False
+                for fn in fallback:
+                    var = fn(var)
+                    if type(var) == bool and False == var:
+                        return False
+                return var
+            for stage in stages:
+                var = stage(var)
+            return var
+
+        return chain
+
+    @staticmethod
+    def __char_class(ranges):
+        # merge overlapping "a-b" ranges so the regex tests as few ranges as possible per character
+        spans = sorted((ord(r[i]), ord(r[i + 2])) for r in ranges for i in range(0, len(r), 3))
+        merged = []
+        for lo, hi in spans:
+            if merged and lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
             else:
-                setattr(cls, func.__name__, staticmethod(wrapper))
+                merged.append([lo, hi])
+        return "[" + "".join("%s-%s" % (re.escape(chr(lo)), re.escape(chr(hi))) for lo, hi in merged) + "]+"
+
+
+class Rule():
+    """
+    a registered rule and its metadata
+    pure: the result only depends on the arguments, so it may be cached or reordered
+    cost: relative cost hint, 0 structural checks and type coercions, 1 plain
+          string or number work, 2 regular expressions
+    is_async: the rule is a coroutine function
+    transform: the rule converts or filters the value and is not a check, it
+               always runs so the data does not depend on which checks ran
+    normalize: for a check returning a converted value, e.g. is_mobile returns
+               str(var), a function returning what the check returns when it
+               passes, run instead of the check when it is skipped
+    """
+
+    def __init__(self, name, func, pure=False, cost=1, is_async=None, transform=False, normalize=None):
+        self.name = name
+        self.func = func
+        self.pure = pure
+        self.cost = cost
+        self.is_async = iscoroutinefunction(func) if is_async is None else is_async
+        self.transform = transform
+        self.normalize = normalize
+
+    def __repr__(self):
+        return "Rule(%r, pure=%r, cost=%r, is_async=%r, transform=%r, normalize=%r)" % (
+            self.name, self.pure, self.cost, self.is_async, self.transform, self.normalize)
+
+
+class RuleRegistry():
+    """
+    map rule names to callables, a registry falls back to its parents in order
+    so registries can be composed and scoped per schema without touching the
+    Validator class, for example:
+
+    registry = RuleRegistry(Validator.registry)
+
+    @registry.extend(pure=True)
+    def is_username(var):
+        return str(var) if re.match("^([a-z0-9_-])+$", str(var), re.IGNORECASE) else False
+
+    v = Validator(registry=registry)
+    """
+
+    # built-in rule name => cost
+    builtin_rules = {
+        "required": 0, "not_empty": 0,
+        "len": 1, "minlen": 1, "maxlen": 1, "width": 1, "minwidth": 1, "maxwidth": 1,
+        "gt": 1, "lt": 1, "gte": 1, "lte": 1, "eq": 1, "ne": 1,
+        "isin": 1, "nin": 1, "match": 1,
+        "is_mobile": 2, "is_email": 2, "is_idcard": 2, "is_ip": 2, "is_url": 2,
+        "is_list": 0, "is_dict": 0, "is_integer": 0, "is_number": 0, "is_str": 0,
+        "is_alpha": 2, "is_alpha_num": 2, "is_alpha_dash_num": 2, "is_zh": 2,
+        "trim": 0, "int": 0, "float": 0, "str": 0,
+        "upper": 1, "lower": 1, "filter_mb4": 2, "filer_emoji": 2, "filer_xss": 1,
+    }
+
+    # built-in rules converting the value instead of checking it
+    builtin_transforms = ("trim", "int", "float", "str", "upper", "lower", "filter_mb4", "filer_emoji", "filer_xss")
+
+    def __init__(self, *parents):
+        self.parents = parents
+        self.rules = {}
+
+    @staticmethod
+    def builtin():
+        """
+        a registry holding the built-in rules of Validator
+        :return:
+        """
+        # the regex checks return str(var), the comparisons turn a numeric string into a number
+        normalizers = dict.fromkeys(("is_mobile", "is_email", "is_idcard", "is_ip", "is_url",
+                                     "is_alpha", "is_alpha_num", "is_alpha_dash_num", "is_zh"), str)
+        normalizers.update(dict.fromkeys(("gt", "lt", "gte", "lte", "eq", "ne"), __class__.__number))
+        registry = RuleRegistry()
+        for name, cost in __class__.builtin_rules.items():
+            registry.register(name, getattr(Validator, name), pure=True, cost=cost, is_async=False,
+                              transform=name in __class__.builtin_transforms, normalize=normalizers.get(name))
+        return registry
+
+    @staticmethod
+    def __number(var):
+        if type(var) != str:
+            return var
+        try:
+            return float(var) if "." in var else int(var)
+        except ValueError:
+            return var
+
+    def register(self, name, func, pure=False, cost=1, is_async=None, transform=False, normalize=None):
+        """
+        register a rule, it may shadow a rule of the parents but not one of this registry
+        :param name:
+        :param func:
+        :param pure:
+        :param cost:
+        :param is_async:
+        :param transform:
+        :param normalize:
+        :return:
+        """
+        if name in self.rules:
+            msg = 'Error method name REPEAT, {} has exist'.format(name)
+            raise NameError(msg)
+        self.rules[name] = Rule(name, func, pure=pure, cost=cost, is_async=is_async, transform=transform,
+                                normalize=normalize)
+        return self.rules[name]
+
+    def extend(self, pure=False, cost=1, is_async=None, transform=False, normalize=None):
+        """
+        decorator registering the function as a rule named after it
+        :param pure:
+        :param cost:
+        :param is_async:
+        :param transform:
+        :param normalize:
+        :return:
+        """
+
+        def decorator(func):
+            self.register(func.__name__, func, pure=pure, cost=cost, is_async=is_async, transform=transform,
+                          normalize=normalize)
             return func
 
         return decorator
 
+    def get(self, name):
+        """
+        get a rule by name, None if neither this registry nor its parents have it
+        :param name:
+        :return:
+        """
+        entry = self.rules.get(name)
+        if entry is not None:
+            return entry
+        for parent in self.parents:
+            entry = parent.get(name)
+            if entry is not None:
+                return entry
+        return None
+
+    def compose(self, *registries):
+        """
+        a new empty registry falling back to this one and then the given ones
+        :param registries:
+        :return:
+        """
+        return RuleRegistry(self, *registries)
+
+    def names(self):
+        """
+        all rule names visible from this registry
+        :return:
+        """
+        names = []
+        for parent in self.parents:
+            names.extend(name for name in parent.names() if name not in names)
+        names.extend(name for name in self.rules if name not in names)
+        return names
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+
+class SampleReport():
+    """
+    per-field failure-rate estimates of a sampled batch, with Wilson score
+    intervals at the given confidence
+    """
+
+    def __init__(self, confidence=0.95):
+        self.confidence = confidence
+        self.records = 0
+        self.sampled = 0
+        self.fields = []
+        self.failures = {}
+
+    def add(self, failed):
+        """
+        count a sampled record and its failing fields
+        :param failed:
+        :return:
+        """
+        self.sampled += 1
+        for field in failed:
+            self.failures[field] = self.failures.get(field, 0) + 1
+
+    def discard(self, failed):
+        """
+        remove a sampled record evicted from the reservoir
+        :param failed:
+        :return:
+        """
+        self.sampled -= 1
+        for field in failed:
+            self.failures[field] -= 1
+
+    def estimate(self, field):
+        """
+        (rate, low, high) of a field
+        :param field:
+        :return:
+        """
+        n = self.sampled
+        if n == 0:
+            return 0.0, 0.0, 1.0
+        rate = self.failures.get(field, 0) / n
+        z = NormalDist().inv_cdf((1 + self.confidence) / 2)
+        denominator = 1 + z * z / n
+        center = (rate + z * z / (2 * n)) / denominator
+        margin = z * math.sqrt(rate * (1 - rate) / n + z * z / (4 * n * n)) / denominator
+        return rate, max(0.0, center - margin), min(1.0, center + margin)
+
+    def estimates(self):
+        """
+        field => (rate, low, high) for every field of the rules
+        :return:
+        """
+        fields = self.fields + [field for field in self.failures if field not in self.fields]
+        return {field: self.estimate(field) for field in fields}
+
 
 class ErrorTemplates():
     @staticmethod
@@ -694,6 +1239,9 @@ class ErrorTemplates():
             "is_url": "%s不是有效的URL地址",
             "is_list": "%s必须是数组",
             "is_dict": "%s必须是字典",
+            "is_integer": "%s必须是整数",
+            "is_number": "%s必须是数字",
+            "is_str": "%s必须是字符串",
             "is_alpha": "%s必须是字母",
             "is_alpha_num": "%s必须是字母或者数字",
             "is_alpha_dash_num": "%s必须是字母、数字或者下划线",
@@ -704,3 +1252,6 @@ class ErrorTemplates():
         #     ...
         # }
     }
+
+
+Validator.registry = RuleRegistry.builtin()